@@ -14,19 +14,13 @@ args = parser.parse_args()
 pattern = pyembroidery.EmbPattern()
 
 x_all, y_all = extract_pt_from_svg(args.input_path, args.scale,
-                                   viz=args.viz, target_units=None)
+                                   viz=args.viz, target_units=None,
+                                   curve_step=args.pitch/args.scale)
 print ('control points extracted from svg')
 
 '''single path'''
 if len(x_all) == 1:
-    x_pos_all = []
-    y_pos_all = []
-    for i in range(len(x_all[0])-1):
-        if i%2 == 0:
-            x, y = draw_line(pattern, [x_all[0][i], y_all[0][i]], [x_all[0][i+1], y_all[0][i+1]],
-                             args.pitch, endpoint=False)
-            x_pos_all += x
-            y_pos_all += y
+    x_pos_all, y_pos_all = draw_path(pattern, x_all[0], y_all[0], args.pitch, endpoint=False)
     pyembroidery.write_dst(pattern, args.output_path + args.output_name)
     print ('single path, pitch=', args.pitch, ', ', args.output_path + args.output_name, 'saved')
     if args.viz:
@@ -42,11 +36,12 @@ if len(x_all) == 2:
     x_pos_all = [[],[]]
     y_pos_all = [[],[]]
     print (len(x_all[0]), len(x_all[1]))
-    x, y = drawline_halfway_1(pattern, x_all, y_all, pitch=args.pitch)
+    crossings = path_crossings(x_all, y_all)
+    x, y = drawline_halfway(pattern, x_all, y_all, 0, pitch=args.pitch, crossings=crossings)
     x_pos_all[0] += x
     y_pos_all[0] += y
     pattern.color_change()
-    x, y = drawline_halfway_2(pattern, x_all, y_all, pitch=args.pitch)
+    x, y = drawline_halfway(pattern, x_all, y_all, 1, pitch=args.pitch, crossings=crossings)
     x_pos_all[1] += x
     y_pos_all[1] += y
 
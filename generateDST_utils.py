@@ -2,71 +2,157 @@ import pyembroidery
 import numpy as np
 import matplotlib.pyplot as plt
 import svgpathtools
-from svgpathtools import svg2paths
+from svgpathtools.svg_to_paths import polyline2pathd, polygon2pathd, ellipse2pathd, rect2pathd
 from scipy import spatial
 import math
+import itertools
+import collections
 import cv2
 import re
+import xml.etree.ElementTree as ET
+
+# A size string such as "10mm": a value followed by optional units.
+_SIZE_RE = re.compile('^([0-9.]+)([a-zA-Z]*)$')
+
+# Scale factors that convert each SVG unit to mm.
+# (use mm as an intermediate since this dict was conveniently defined by the code linked below)
+_SCALES_TO_MM = {
+    # "px" (or "no units") is 96 dpi: 1 inch/96 px * 25.4 mm/1 inch = 25.4/96 mm/px
+    '': 25.4/96,
+    'px': 25.4/96,
+
+    # "pt" is 72 dpi: 1 inch/72 pt * 25.4 mm/1 inch = 25.4/72 mm/pt
+    'pt': 25.4/72,
+
+    # Units are Picas "pc", 6 dpi: 1 inch/6 pc * 25.4 mm/1 inch = 25.4/6 mm/pc
+    'pc': 25.4/6,
+
+    'cm': 10.0,
+    'mm': 1.0,
+
+    # Units are inches: 25.4 mm/1 inch
+    'in': 25.4
+}
+
+# Divisors that convert mm to each supported target unit.
+_TARGET_DIVISOR = {
+    'mm': 1.0, 'millimeter': 1.0, 'millimeters': 1.0,
+    'cm': 10.0, 'centimeter': 10.0, 'centimeters': 10.0,
+    'in': 25.4, 'inch': 25.4, 'inches': 25.4,
+}
 
 # Parse a size string such as "10mm" into its value, and convert it to the target units.
 # Adapted from https://github.com/SebKuzminsky/svg2gcode/blob/94f28c1877c721c66cd90a38750f78d8031ac85a/gcoder.py#L238
 def _parse_svg_size_string(size_str, target_units='mm'):
     # Get the original value and units.
-    m = re.match('^([0-9.]+)([a-zA-Z]*)$', size_str)
-    if m == None or len(m.groups()) != 2:
+    m = _SIZE_RE.match(size_str)
+    if m == None:
         print("failed to parse SVG viewport height/width: %s" % size_str)
         return None
     val = float(m.group(1))
     units = m.group(2)
-    
-    # Get a scale factor that converts to mm.
-    # (use mm as an intermediate since the below dict was conveniently defined by the code at the above link)
-    scales_to_get_mm = {
-        # "px" (or "no units") is 96 dpi: 1 inch/96 px * 25.4 mm/1 inch = 25.4/96 mm/px
-        '': 25.4/96,
-        'px': 25.4/96,
-        
-        # "pt" is 72 dpi: 1 inch/72 pt * 25.4 mm/1 inch = 25.4/72 mm/pt
-        'pt': 25.4/72,
-        
-        # Units are Picas "pc", 6 dpi: 1 inch/6 pc * 25.4 mm/1 inch = 25.4/6 mm/pc
-        'pc': 25.4/6,
-        
-        'cm': 10.0,
-        'mm': 1.0,
-        
-        # Units are inches: 25.4 mm/1 inch
-        'in': 25.4
-    }
-    scale_to_get_mm = scales_to_get_mm[units]
-    
+
     # Convert to target units.
-    if target_units.lower() in ['mm', 'millimeter', 'millimeters']:
-        scale = scale_to_get_mm
-    elif target_units.lower() in ['cm', 'centimeter', 'centimeters']:
-        scale = scale_to_get_mm / 10.0
-    elif target_units.lower() in ['in', 'inch', 'inches']:
-        scale = scale_to_get_mm / 25.4
-    else:
+    divisor = _TARGET_DIVISOR.get(target_units.lower())
+    if divisor is None:
         raise ValueError('Units of %s are not yet supported' % target_units)
-    
-    return val*scale
-
-def extract_pt_from_svg(file, scale, viz, target_units):
-    paths, attributes = svg2paths(file)
-    # print (paths) # 0:path, 1:sec, 2:point
 
+    return val * (_SCALES_TO_MM[units] / divisor)
+
+# d-attribute builders for the svg shapes that are stitched, keyed by tag name
+_SVG_SHAPES = {
+    'path': lambda a: a.get('d', ''),
+    'polyline': polyline2pathd,
+    'polygon': polygon2pathd,
+    'line': lambda a: 'M%s %sL%s %s' % (a.get('x1', '0'), a.get('y1', '0'),
+                                        a.get('x2', '0'), a.get('y2', '0')),
+    'ellipse': ellipse2pathd,
+    'circle': ellipse2pathd,
+    'rect': rect2pathd,
+}
+
+def iter_svg_paths(file, svg_attributes=None):
+    """yield a svgpathtools Path for each drawable element of the svg in
+    document order, parsing incrementally and detaching every element from
+    the tree once it is finished, so memory stays flat however many elements
+    the file has. If a dict svg_attributes is given it is filled with the
+    attributes of the root svg element, so callers need not parse the file a
+    second time"""
+    # elements started but not yet finished, the root first
+    open_elems = []
+    for event, elem in ET.iterparse(file, events=('start', 'end')):
+        if event == 'start':
+            if not open_elems and svg_attributes is not None:
+                svg_attributes.update(elem.attrib)
+            open_elems.append(elem)
+            continue
+        open_elems.pop()
+        to_d = _SVG_SHAPES.get(elem.tag.rsplit('}', 1)[-1])
+        if to_d is not None:
+            yield svgpathtools.parse_path(to_d(elem.attrib))
+        # the parser keeps each element on its parent, so take it off
+        if open_elems:
+            open_elems[-1].remove(elem)
+
+def _flatten_bezier(seg, tol, pts):
+    # distance of each inner control point from its share of the chord;
+    # the curve lies within the control polygon, so under tol means flat
+    bpts = seg.bpoints()
+    d = len(bpts) - 1
+    p0, pd = bpts[0], bpts[-1]
+    flatness = max(abs(bpts[k] - (p0 + (pd - p0) * k / d)) for k in range(1, d))
+    if flatness < tol:
+        pts.append(seg.end)
+    else:
+        first, second = seg.split(0.5)
+        _flatten_bezier(first, tol, pts)
+        _flatten_bezier(second, tol, pts)
+
+def split_segment(seg, step):
+    """points a svg segment is split at, as complex numbers. beziers are
+    subdivided only where they bend more than step/2 away from their chord,
+    so near-straight spans stay a single stitch line; arcs are cut into
+    pieces of equal arc length no longer than step; lines, or any segment
+    when step is None, keep only their endpoints"""
+    if step is None or isinstance(seg, svgpathtools.Line):
+        return [seg.start, seg.end]
+    if isinstance(seg, (svgpathtools.QuadraticBezier, svgpathtools.CubicBezier)):
+        pts = [seg.start]
+        _flatten_bezier(seg, step / 2.0, pts)
+        return pts
+    length = seg.length()
+    n = int(math.ceil(length / step))
+    if n <= 1:
+        return [seg.start, seg.end]
+    # ilength inverts the arc length, so the cuts are evenly spaced along
+    # the curve rather than evenly spaced in the parameter t
+    pts = [seg.start]
+    pts += [seg.point(seg.ilength(length * k / n)) for k in range(1, n)]
+    pts.append(seg.end)
+    return pts
+
+def extract_pt_from_svg(file, scale, viz, target_units, curve_step=None):
     x_all = []
     y_all = []
-
-    for i in range(len(paths)):
-        x = []
-        y = []
-        for j in range(len(paths[i])):
-            for k in [0, -1]:
-                # print (paths[i][j][k])
-                x.append(paths[i][j][k].real)
-                y.append(-paths[i][j][k].imag)
+    svg_attributes = {}
+
+    for path in iter_svg_paths(file, svg_attributes):
+        cuts = [split_segment(seg, curve_step) for seg in path]
+        sizes = np.array([len(c) for c in cuts], dtype=int)
+        # every cut point of the path in one presized array; each point
+        # starts a piece unless it ends its svg segment, and ends one
+        # unless it starts its svg segment
+        flat = np.fromiter(itertools.chain.from_iterable(cuts), dtype=complex,
+                           count=sizes.sum())
+        last = np.zeros(len(flat), dtype=bool)
+        last[np.cumsum(sizes) - 1] = True
+        first = np.roll(last, 1)
+        pts = np.column_stack((flat[~last], flat[~first]))
+        # drop zero-length segments, which would only stitch in place
+        pts = pts[pts[:, 0] != pts[:, 1]].ravel()
+        # split the complex points into x and flipped y arrays
+        x = pts.real
+        y = -pts.imag
 
         x_all.append(x)
         y_all.append(y)
@@ -77,9 +163,8 @@ def extract_pt_from_svg(file, scale, viz, target_units):
 
     if target_units != None:
     
-        # Scale to get the desired units.
-        doc = svgpathtools.Document(file)
-        svg_attributes = doc.root.attrib
+        # Scale to get the desired units, from the root attributes read
+        # during the pass above.
         if 'width' not in svg_attributes or 'height' not in svg_attributes:
             print('Size information was not found in the SVG. Using raw point coordinates.')
         else:
@@ -87,16 +172,14 @@ def extract_pt_from_svg(file, scale, viz, target_units):
             # For example, point_arrays can be x_all or y_all.
             def scale_point_arrays(point_arrays, target_range, name):
                 # Get the min and max of points across all arrays.
-                points_min = min([min(points) for points in point_arrays])
-                points_max = max([max(points) for points in point_arrays])
+                points_min = min([points.min() for points in point_arrays])
+                points_max = max([points.max() for points in point_arrays])
                 # Compute the scale factor.
                 points_range = abs(points_max - points_min)
                 scale_factor = target_range / points_range
                 # Scale it!
                 print('Scaling %s by a factor of %g' % (name, scale_factor))
-                for (i, points) in enumerate(point_arrays):
-                    point_arrays[i] = [point*scale_factor for point in points]
-                return point_arrays
+                return [points*scale_factor for points in point_arrays]
             # Get the actual size in physical units.
             svg_width = _parse_svg_size_string(svg_attributes['width'], target_units=target_units)
             svg_height = _parse_svg_size_string(svg_attributes['height'], target_units=target_units)
@@ -108,193 +191,201 @@ def extract_pt_from_svg(file, scale, viz, target_units):
             # plt.show()
 
     # Apply any user-specified scaling.
-    for (i, points) in enumerate(x_all):
-        x_all[i] = [point*scale for point in points]
-    for (i, points) in enumerate(y_all):
-        y_all[i] = [point*scale for point in points]
+    x_all = [points*scale for points in x_all]
+    y_all = [points*scale for points in y_all]
     return x_all, y_all
 
 
-def draw_line(pattern, st, ed, pitch, endpoint):
-    x_pos = []
-    y_pos = []
-    x_dis = ed[0] - st[0]
-    y_dis = ed[1] - st[1]
-    dis = np.sqrt(x_dis**2 + y_dis**2)
-
-    sec = dis//pitch
-
-    if sec == 0:
-        sec = 1
-
-    x = np.linspace(st[0], ed[0], int(sec)+1, endpoint=endpoint)
-    y = np.linspace(st[1], ed[1], int(sec)+1, endpoint=endpoint)
-
-    # print (len(x))
-    for i in range(len(x)):
-        pattern.add_stitch_absolute(pyembroidery.STITCH, x[i], y[i])
-
-        x_pos.append(x[i])
-        y_pos.append(y[i])
-
+def snap_stitches(pts, groups=None):
+    """round (n, 2) stitch positions onto the integer 0.1mm grid that dst
+    stores, half to even on absolute positions just as write_dst does, and
+    drop any stitch landing on the same spot as the one before, unless groups
+    is given and the two belong to different groups"""
+    pts = np.round(pts)
+    if len(pts) > 1:
+        keep = np.ones(len(pts), dtype=bool)
+        keep[1:] = np.any(pts[1:] != pts[:-1], axis=1)
+        if groups is not None:
+            keep[1:] |= groups[1:] != groups[:-1]
+        pts = pts[keep]
+    return pts
+
+def pitch_sections(dis, pitch):
+    """whole number of pitch lengths in dis, for a scalar or an array. The
+    tolerance keeps a length that is an exact multiple of pitch from losing a
+    section to float noise"""
+    return np.floor(dis / pitch + 1e-9).astype(int)
+
+def piece_stitches(st, ed, through, pitch, groups=None, endpoint=True):
+    """stitch positions for all the pieces st[k] to ed[k], in order, as one
+    (n, 2) array. A piece marked through is stitched end to end at most pitch
+    apart, as np.linspace would with endpoint; any other gets stitches
+    strictly inside it, a single one in the middle if it is up to 3 pitches
+    long, otherwise evenly spaced about pitch apart. Repeated positions are
+    dropped only within one of groups"""
+    st = np.asarray(st, dtype=float)
+    d = np.asarray(ed, dtype=float) - st
+    dis = np.hypot(d[:, 0], d[:, 1])
+    short = dis <= 3 * pitch
+    sec = pitch_sections(dis, pitch)
+    # stitches in each piece, the number of equal steps they divide it
+    # into, and the step the first of them is at
+    counts = np.where(through, np.maximum(sec, 1) + 1, np.where(short, 1, sec - 2))
+    steps = np.where(through, np.maximum(sec, 1) + (not endpoint), np.where(short, 2, sec - 1))
+    first = np.where(through, 0, 1)
+    # piece of every stitch, and its step index within that piece
+    piece = np.repeat(np.arange(len(counts)), counts)
+    k = np.arange(len(piece)) - np.repeat(np.cumsum(counts) - counts, counts) + first[piece]
+    ratio = (k / steps[piece])[:, None]
+    if groups is not None:
+        groups = np.asarray(groups)[piece]
+    return snap_stitches(st[piece] + d[piece] * ratio, groups)
+
+def add_stitches(pattern, pts):
+    # hand the sampled positions to the pattern as python floats
+    x_pos, y_pos = pts[:, 0].tolist(), pts[:, 1].tolist()
+    pattern.add_stitches_absolute(pyembroidery.STITCH, x_pos, y_pos)
     return x_pos, y_pos
 
-def draw_line_mid(pattern, st, ed, pitch):
-    x_pos = []
-    y_pos = []
-    x_dis = ed[0] - st[0]
-    y_dis = ed[1] - st[1]
-    dis = np.sqrt(x_dis**2 + y_dis**2)
-
-
-    if dis <= 3 * pitch:
-        x_mid = (st[0] + ed[0])/2
-        y_mid = (st[1] + ed[1])/2
-        pattern.add_stitch_absolute(pyembroidery.STITCH, x_mid, y_mid)
-        return [x_mid], [y_mid]
-
-    else:
-        sec = dis//pitch
-        x = np.linspace(st[0], ed[0], int(sec), endpoint=True)
-        y = np.linspace(st[1], ed[1], int(sec), endpoint=True)
-
-        x = x[1:-1]
-        y = y[1:-1]
-
-        # print (len(x))
-        for i in range(len(x)):
-            pattern.add_stitch_absolute(pyembroidery.STITCH, x[i], y[i])
-
-            x_pos.append(x[i])
-            y_pos.append(y[i])
-
-    return x_pos, y_pos
-
-
-def line_intersection(x1, y1, x2, y2, x3, y3, x4, y4):
-    """find the intersection of line segments A=(x1,y1)/(x2,y2) and
-    B=(x3,y3)/(x4,y4). Returns a point or None"""
-    denom = ((x1 - x2) * (y3 - y4) - (y1 - y2) * (x3 - x4))
-    if denom==0: return None
-    px = ((x1 * y2 - y1 * x2) * (x3 - x4) - (x1 - x2) * (x3 * y4 - y3 * x4)) / denom
-    py = ((x1 * y2 - y1 * x2) * (y3 - y4) - (y1 - y2) * (x3 * y4 - y3 * x4)) / denom
-    if (px - x1) * (px - x2) < 0 and (py - y1) * (py - y2) < 0 \
-      and (px - x3) * (px - x4) < 0 and (py - y3) * (py - y4) < 0:
-        return [px, py]
-    else:
-        return None
-
-
-def drawline_halfway_1(pattern, x_all, y_all, pitch):
-    pos_x = []
-    pos_y = []
-    for i in range(len(x_all[0])//2):
-        pt_x = []
-        pt_y = []
-        pt_x.append(x_all[0][2*i])
-        pt_y.append(y_all[0][2*i])
-
-        for j in range(len(x_all[1])//2):
-            int_pt = line_intersection(x_all[0][2*i], y_all[0][2*i], x_all[0][2*i+1], y_all[0][2*i+1],
-                                       x_all[1][2*j], y_all[1][2*j], x_all[1][2*j+1], y_all[1][2*j+1])
-
-            if int_pt:
-                pt_x.append(int_pt[0])
-                pt_y.append(int_pt[1])
-
-        pt_x.append(x_all[0][2*i+1])
-        pt_y.append(y_all[0][2*i+1])
-
-
-        # print ('compare', x_all[1][2*i], x_all[1][2*i+1], pt_x[-2], pt_x[1])
-        if len(pt_x) > 3:
-            if (x_all[0][2*i] > x_all[0][2*i+1] and pt_x[-2] > pt_x[1]) or (x_all[0][2*i] < x_all[0][2*i+1] and pt_x[-2] < pt_x[1]):
-                temp_x = pt_x[1:-1]
-                x = temp_x[::-1]
-                temp_y = pt_y[1:-1]
-                y = temp_y[::-1]
-                pt_x[1:-1] =  x
-                pt_y[1:-1] =  y
-
-
-        # for l in range(len(pt_x)):
-        #     # print (pt_x[l], pt_y[l])
-        #     plt.scatter(pt_x[:l+1], pt_y[:l+1], c='red', s=20)
-        #     # plt.ylim(-400, 0)
-        #     # plt.xlim(-100, 600)
-        #     # plt.show()
-
-
-        if len(pt_x) <= 1:
-            raise Exception("error!")
-        elif len(pt_x) == 2:
-            for l in range(len(pt_x)-1):
-                x, y = draw_line(pattern, [pt_x[l], pt_y[l]], [pt_x[l+1], pt_y[l+1]], pitch, True)
-                pos_x += x
-                pos_y += y
-        else:
-            # x, y = draw_line(pattern, [pt_x[0], pt_y[0]], [pt_x[1], pt_y[1]], pitch, False)
-            # print ('x0',len(x))
-            # pos_x += x
-            # pos_y += y
-            for l in range(len(pt_x)-1):
-                x, y = draw_line_mid(pattern, [pt_x[l], pt_y[l]], [pt_x[l+1], pt_y[l+1]], pitch)
-                pos_x += x
-                pos_y += y
-
-        #     x, y = draw_line(pattern, [pt_x[-2], pt_y[-2]], [pt_x[-1], pt_y[-1]], pitch, False)
-        # #     print ('x1', len(x))
-        #     pos_x += x
-        #     pos_y += y
-        # print (len(pos_x))
-    return  pos_x, pos_y
-
-def drawline_halfway_2(pattern, x_all, y_all, pitch):
-    pos_x = []
-    pos_y = []
-    for i in range(len(x_all[1])//2):
-        pt_x = []
-        pt_y = []
-        pt_x.append(x_all[1][2*i])
-        pt_y.append(y_all[1][2*i])
-
-        for j in range(len(x_all[0])//2):
-            int_pt = line_intersection(x_all[1][2*i], y_all[1][2*i], x_all[1][2*i+1], y_all[1][2*i+1],
-                                       x_all[0][2*j], y_all[0][2*j], x_all[0][2*j+1], y_all[0][2*j+1])
-
-            if int_pt:
-                pt_x.append(int_pt[0])
-                pt_y.append(int_pt[1])
-
-        pt_x.append(x_all[1][2*i+1])
-        pt_y.append(y_all[1][2*i+1])
-
-        if len(pt_x) > 3:
-            if (y_all[1][2*i] > y_all[1][2*i+1] and pt_y[-2] > pt_y[1]) or (y_all[1][2*i] < y_all[1][2*i+1] and pt_y[-2] < pt_y[1]):
-                temp_x = pt_x[1:-1]
-                x = temp_x[::-1]
-                temp_y = pt_y[1:-1]
-                y = temp_y[::-1]
-                pt_x[1:-1] =  x
-                pt_y[1:-1] =  y
-
-
-        if len(pt_x) <= 1:
-            raise Exception("error!")
-        elif len(pt_x) == 2:
-            for l in range(len(pt_x)-1):
-                x, y = draw_line(pattern, [pt_x[l], pt_y[l]], [pt_x[l+1], pt_y[l+1]], pitch, True)
-                pos_x += x
-                pos_y += y
-        else:
-            # x, y = draw_line(pattern, [pt_x[0], pt_y[0]], [pt_x[1], pt_y[1]], pitch, False)
-            # pos_x += x
-            # pos_y += y
-            for l in range(len(pt_x)-1):
-                x, y = draw_line_mid(pattern, [pt_x[l], pt_y[l]], [pt_x[l+1], pt_y[l+1]], pitch)
-                pos_x += x
-                pos_y += y
-            # x, y = draw_line(pattern, [pt_x[-2], pt_y[-2]], [pt_x[-1], pt_y[-1]], pitch, True)
-            # pos_x += x
-            # pos_y += y
-    return  pos_x, pos_y
+def draw_path(pattern, x, y, pitch, endpoint):
+    """stitch every segment of one path end to end, at most pitch apart and
+    including each segment's end only if endpoint is set, sampling them all
+    in one batch and adding them to the pattern at once"""
+    s = segment_arrays(x, y)
+    n = len(s.x1)
+    pts = piece_stitches(np.column_stack((s.x1, s.y1)), np.column_stack((s.x2, s.y2)),
+                         np.ones(n, dtype=bool), pitch, groups=np.arange(n),
+                         endpoint=endpoint)
+    return add_stitches(pattern, pts)
+
+
+# the segments of one path as parallel arrays, see segment_arrays
+Segments = collections.namedtuple(
+    'Segments', 'x1 y1 x2 y2 xmin xmax ymin ymax dx dy cross')
+
+
+def segment_arrays(x, y):
+    """the segments of one path as arrays: endpoints x1, y1, x2, y2,
+    bounding boxes xmin, xmax, ymin, ymax, directions dx, dy and cross
+    products dx*y1 - dy*x1, so a segment can be tested against all of them
+    in one vectorized step"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x1, y1, x2, y2 = x[0::2], y[0::2], x[1::2], y[1::2]
+    dx, dy = x2 - x1, y2 - y1
+    return Segments(x1, y1, x2, y2, np.minimum(x1, x2), np.maximum(x1, x2),
+                    np.minimum(y1, y2), np.maximum(y1, y2), dx, dy, dx * y1 - dy * x1)
+
+
+def nearby_segments(segments, others):
+    """for each segment given by segment_arrays, the indices of the segments
+    in others close enough to cross it, found with a kd-tree over the others'
+    midpoints rather than by scanning all of them"""
+    tree = spatial.cKDTree(np.column_stack(((others.x1 + others.x2) / 2,
+                                            (others.y1 + others.y2) / 2)))
+    # two segments can only cross if their midpoints are within the sum of
+    # their half lengths, and the others' half length is at most reach
+    reach = np.hypot(others.dx, others.dy).max() / 2
+    mids = np.column_stack(((segments.x1 + segments.x2) / 2,
+                            (segments.y1 + segments.y2) / 2))
+    return tree.query_ball_point(mids, np.hypot(segments.dx, segments.dy) / 2 + reach)
+
+
+def segment_crossings(x1, y1, x2, y2, others, near=None):
+    """indices of the segments given by segment_arrays that segment
+    (x1,y1)/(x2,y2) strictly crosses, with the fractions t along this segment
+    and u along each of them at the crossing, optionally only looking at the
+    candidate indices near"""
+    near = np.arange(len(others.x1)) if near is None else np.asarray(near, dtype=int)
+    # segments whose bounding box misses this one cannot cross it, so drop
+    # them with four comparisons before any cross products are taken
+    near = near[(others.xmax[near] >= min(x1, x2)) & (others.xmin[near] <= max(x1, x2)) &
+                (others.ymax[near] >= min(y1, y2)) & (others.ymin[near] <= max(y1, y2))]
+    ox1, oy1, ox2, oy2 = others.x1[near], others.y1[near], others.x2[near], others.y2[near]
+    sx, sy, sc = others.dx[near], others.dy[near], others.cross[near]
+    rx, ry = x2 - x1, y2 - y1
+    rc = rx * y1 - ry * x1
+    # which side of this segment's line each end of the others lies on, and
+    # which side of each other line the ends of this segment lie on, with
+    # the cross products of the fixed ends taken once per segment
+    d1 = rx * oy1 - ry * ox1 - rc
+    d2 = rx * oy2 - ry * ox2 - rc
+    e1 = sx * y1 - sy * x1 - sc
+    e2 = sx * y2 - sy * x2 - sc
+    hits = np.nonzero((d1 * d2 < 0) & (e1 * e2 < 0))[0]
+    # only the few real crossings pay for the division
+    t = e1[hits] / (e1[hits] - e2[hits])
+    u = d1[hits] / (d1[hits] - d2[hits])
+    return near[hits], t, u
+
+
+def paths_overlap(a, b):
+    """whether the overall bounding boxes of two paths given by
+    segment_arrays overlap"""
+    if len(a.x1) == 0 or len(b.x1) == 0:
+        return False
+    return not (a.xmax.max() < b.xmin.min() or a.xmin.min() > b.xmax.max() or
+                a.ymax.max() < b.ymin.min() or a.ymin.min() > b.ymax.max())
+
+
+def path_crossings(x_all, y_all):
+    """crossings between the two paths, found once and shared by both
+    drawline_halfway passes: for each path a dict from segment index to
+    arrays t, x, y of the points where that segment is crossed, t being the
+    fraction along it"""
+    found = ({}, {})
+    a = segment_arrays(x_all[0], y_all[0])
+    b = segment_arrays(x_all[1], y_all[1])
+    # when the two paths are apart no pair can cross, so skip the search
+    if not paths_overlap(a, b):
+        return found
+    # each crossing is computed once and recorded on both segments, placed
+    # along each segment's own direction
+    for i, (x1, y1, x2, y2, near) in enumerate(zip(a.x1.tolist(), a.y1.tolist(),
+                                                   a.x2.tolist(), a.y2.tolist(),
+                                                   nearby_segments(a, b))):
+        j, t, u = segment_crossings(x1, y1, x2, y2, b, near)
+        if len(j) == 0:
+            continue
+        found[0][i] = (t, x1 + t * (x2 - x1), y1 + t * (y2 - y1))
+        bx = b.x1[j] + u * b.dx[j]
+        by = b.y1[j] + u * b.dy[j]
+        for k, point in zip(j.tolist(), zip(u.tolist(), bx.tolist(), by.tolist())):
+            found[1].setdefault(k, []).append(point)
+    for k, points in found[1].items():
+        found[1][k] = tuple(np.array(points).T)
+    return found
+
+
+def drawline_halfway(pattern, x_all, y_all, index, pitch, crossings=None):
+    """stitch path x_all[index], y_all[index] against the other of the two
+    paths: segments that cross nothing are stitched end to end, and segments
+    with crossings are stitched only between them, stepping over each one.
+    crossings is the result of path_crossings, computed here if not given"""
+    if crossings is None:
+        crossings = path_crossings(x_all, y_all)
+    crossed = crossings[index]
+    segments = segment_arrays(x_all[index], y_all[index])
+    x1, y1, x2, y2 = segments.x1, segments.y1, segments.x2, segments.y2
+    through = np.ones(len(x1), dtype=bool)
+    through[list(crossed)] = False
+    # segments that cross nothing are each a single piece
+    seg = [np.nonzero(through)[0]]
+    st = [np.column_stack((x1, y1))[through]]
+    ed = [np.column_stack((x2, y2))[through]]
+    # the others are cut into pieces at their crossings, ordered by their
+    # fraction along the segment
+    for i, (t, int_x, int_y) in crossed.items():
+        order = np.argsort(t)
+        px = np.concatenate(([x1[i]], int_x[order], [x2[i]]))
+        py = np.concatenate(([y1[i]], int_y[order], [y2[i]]))
+        seg.append(np.full(len(px) - 1, i))
+        st.append(np.column_stack((px[:-1], py[:-1])))
+        ed.append(np.column_stack((px[1:], py[1:])))
+    seg = np.concatenate(seg)
+    # back into path order, and sample every piece of the pass in one batch
+    order = np.argsort(seg, kind='stable')
+    seg = seg[order]
+    pts = piece_stitches(np.concatenate(st)[order], np.concatenate(ed)[order],
+                         through[seg], pitch, groups=seg)
+    return add_stitches(pattern, pts)
@@ -15,6 +15,90 @@ def bit(b):
     return 1 << b
 
 
+def _encode_dx(x):
+    b0 = 0
+    b1 = 0
+    b2 = 0
+    if x > 40:
+        b2 += bit(2)
+        x -= 81
+    if x < -40:
+        b2 += bit(3)
+        x += 81
+    if x > 13:
+        b1 += bit(2)
+        x -= 27
+    if x < -13:
+        b1 += bit(3)
+        x += 27
+    if x > 4:
+        b0 += bit(2)
+        x -= 9
+    if x < -4:
+        b0 += bit(3)
+        x += 9
+    if x > 1:
+        b1 += bit(0)
+        x -= 3
+    if x < -1:
+        b1 += bit(1)
+        x += 3
+    if x > 0:
+        b0 += bit(0)
+        x -= 1
+    if x < 0:
+        b0 += bit(1)
+        x += 1
+    if x != 0:
+        raise ValueError("The dx value given to the writer exceeds maximum allowed.")
+    return b0, b1, b2
+
+
+def _encode_dy(y):
+    b0 = 0
+    b1 = 0
+    b2 = 0
+    if y > 40:
+        b2 += bit(5)
+        y -= 81
+    if y < -40:
+        b2 += bit(4)
+        y += 81
+    if y > 13:
+        b1 += bit(5)
+        y -= 27
+    if y < -13:
+        b1 += bit(4)
+        y += 27
+    if y > 4:
+        b0 += bit(5)
+        y -= 9
+    if y < -4:
+        b0 += bit(4)
+        y += 9
+    if y > 1:
+        b1 += bit(7)
+        y -= 3
+    if y < -1:
+        b1 += bit(6)
+        y += 3
+    if y > 0:
+        b0 += bit(7)
+        y -= 1
+    if y < 0:
+        b0 += bit(6)
+        y += 1
+    if y != 0:
+        raise ValueError("The dy value given to the writer exceeds maximum allowed.")
+    return b0, b1, b2
+
+
+# The x and y bits of a record never overlap, so each axis is encoded once
+# per possible value here and records are built by or-ing the two lookups.
+DX_BITS = {v: _encode_dx(v) for v in range(-MAX_STITCH_DISTANCE, MAX_STITCH_DISTANCE + 1)}
+DY_BITS = {v: _encode_dy(v) for v in range(-MAX_STITCH_DISTANCE, MAX_STITCH_DISTANCE + 1)}
+
+
 def encode_record(x, y, flags):
     y = -y  # flips the coordinate y space.
     b0 = 0
@@ -25,74 +109,17 @@ def encode_record(x, y, flags):
     if flags == STITCH or flags == JUMP or flags == SEQUIN_EJECT:
         b2 += bit(0)
         b2 += bit(1)
-        if x > 40:
-            b2 += bit(2)
-            x -= 81
-        if x < -40:
-            b2 += bit(3)
-            x += 81
-        if x > 13:
-            b1 += bit(2)
-            x -= 27
-        if x < -13:
-            b1 += bit(3)
-            x += 27
-        if x > 4:
-            b0 += bit(2)
-            x -= 9
-        if x < -4:
-            b0 += bit(3)
-            x += 9
-        if x > 1:
-            b1 += bit(0)
-            x -= 3
-        if x < -1:
-            b1 += bit(1)
-            x += 3
-        if x > 0:
-            b0 += bit(0)
-            x -= 1
-        if x < 0:
-            b0 += bit(1)
-            x += 1
-        if x != 0:
-            raise ValueError(
-                "The dx value given to the writer exceeds maximum allowed."
-            )
-        if y > 40:
-            b2 += bit(5)
-            y -= 81
-        if y < -40:
-            b2 += bit(4)
-            y += 81
-        if y > 13:
-            b1 += bit(5)
-            y -= 27
-        if y < -13:
-            b1 += bit(4)
-            y += 27
-        if y > 4:
-            b0 += bit(5)
-            y -= 9
-        if y < -4:
-            b0 += bit(4)
-            y += 9
-        if y > 1:
-            b1 += bit(7)
-            y -= 3
-        if y < -1:
-            b1 += bit(6)
-            y += 3
-        if y > 0:
-            b0 += bit(7)
-            y -= 1
-        if y < 0:
-            b0 += bit(6)
-            y += 1
-        if y != 0:
-            raise ValueError(
-                "The dy value given to the writer exceeds maximum allowed."
-            )
+        try:
+            x0, x1, x2 = DX_BITS[x]
+        except KeyError:
+            x0, x1, x2 = _encode_dx(x)
+        try:
+            y0, y1, y2 = DY_BITS[y]
+        except KeyError:
+            y0, y1, y2 = _encode_dy(y)
+        b0 |= x0 | y0
+        b1 |= x1 | y1
+        b2 |= x2 | y2
     elif flags == COLOR_CHANGE:
         b2 = 0b11000011
     elif flags == STOP:
@@ -163,6 +190,7 @@ def write(pattern, f, settings=None):
         f.write(b"\x20")  # space
 
     stitches = pattern.stitches
+    records = bytearray()
     xx = 0
     yy = 0
     for stitch in stitches:
@@ -176,10 +204,11 @@ def write(pattern, f, settings=None):
         yy += dy
         if data == TRIM:
             delta = -4
-            f.write(encode_record(-delta / 2, -delta / 2, JUMP))
+            records += encode_record(-delta / 2, -delta / 2, JUMP)
             for p in range(1, trim_at - 1):
-                f.write(encode_record(delta, delta, JUMP))
+                records += encode_record(delta, delta, JUMP)
                 delta = -delta
-            f.write(encode_record(delta / 2, delta / 2, JUMP))
+            records += encode_record(delta / 2, delta / 2, JUMP)
         else:
-            f.write(encode_record(dx, dy, data))
+            records += encode_record(dx, dy, data)
+    f.write(records)
@@ -510,6 +510,16 @@ class EmbPattern:
         self._previousX = x
         self._previousY = y
 
+    def add_stitches_absolute(self, cmd, xs, ys):
+        """Add a command at each absolute location given by the
+        parallel sequences xs, ys, in a single extend of the stitches"""
+        stitches = [[x, y, cmd] for x, y in zip(xs, ys)]
+        if len(stitches) == 0:
+            return
+        self.stitches.extend(stitches)
+        self._previousX = stitches[-1][0]
+        self._previousY = stitches[-1][1]
+
     def add_stitch_relative(self, cmd, dx=0, dy=0):
         """Add a command relative to the previous location"""
         x = self._previousX + dx
@@ -430,3 +430,17 @@ class TestEmbpattern(unittest.TestCase):
         self.assertEqual(len(blocks), 2)
         self.assertEqual(len(blocks[0][0]), 2)
         self.assertEqual(len(blocks[1][0]), 2)
+
+    def test_add_stitches_absolute(self):
+        xs = [0, 10, 20, 30]
+        ys = [5, 15, 25, 35]
+        pattern = EmbPattern()
+        pattern.add_stitches_absolute(STITCH, xs, ys)
+        single = EmbPattern()
+        for x, y in zip(xs, ys):
+            single.add_stitch_absolute(STITCH, x, y)
+        self.assertEqual(pattern.stitches, single.stitches)
+        pattern.add_stitch_relative(STITCH, 1, 1)
+        self.assertEqual(pattern.stitches[-1], [31, 36, STITCH])
+        pattern.add_stitches_absolute(JUMP, [], [])
+        self.assertEqual(len(pattern.stitches), 5)
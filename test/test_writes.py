@@ -28,6 +28,36 @@ class TestWrites(unittest.TestCase):
         print("dst: ", dst_pattern.stitches)
         self.addCleanup(os.remove, file1)
 
+    def test_write_dst_read_dst_full_range(self):
+        file1 = "range.dst"
+        pattern = EmbPattern()
+        x = 0
+        y = 0
+        for d in range(-121, 122):
+            x += d
+            y -= d
+            pattern.add_stitch_absolute(STITCH, x, y)
+        write_dst(pattern, file1)
+        dst_pattern = read_dst(file1)
+        self.assertEqual(dst_pattern.count_stitch_commands(STITCH), 243)
+        read_stitches = dst_pattern.get_match_commands(STITCH)
+        for stitch, read in zip(pattern.stitches, read_stitches):
+            self.assertEqual(stitch[:2], read[:2])
+        self.addCleanup(os.remove, file1)
+
+    def test_write_dst_rounds_absolute_positions(self):
+        file1 = "half.dst"
+        pattern = EmbPattern()
+        for x in (0, 7.5, 15, 22.5, 29.5):
+            pattern.add_stitch_absolute(STITCH, x, 0)
+        write_dst(pattern, file1)
+        dst_pattern = read_dst(file1)
+        read_stitches = dst_pattern.get_match_commands(STITCH)
+        # positions round half to even on their own, not relative to the
+        # previous rounded stitch
+        self.assertEqual([s[0] for s in read_stitches], [0, 8, 15, 22, 30])
+        self.addCleanup(os.remove, file1)
+
     def test_write_exp_read_exp(self):
         file1 = "file.exp"
         write_exp(get_big_pattern(), file1)